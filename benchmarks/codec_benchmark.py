@@ -0,0 +1,65 @@
+"""Protocol codec versus the previous json.dumps/json.loads path.
+
+Encodes CMD_QUERY and CMD_SET requests and decodes a typical query reply
+with both implementations, reporting the time per operation.
+
+Run from the repository root (needs Home Assistant installed, like the
+integration itself):
+
+    python -m benchmarks.codec_benchmark --number 200000
+"""
+import argparse
+import json
+import timeit
+
+from custom_components.cozylife import codec
+from custom_components.cozylife.const import CMD_QUERY, CMD_SET, QUERY_ATTRS
+
+SN = "1760000000000"
+REPLY = (
+    b'{"cmd": 2, "pv": 0, "sn": "1760000000000", "res": 0, "msg": '
+    b'{"attr": [1, 27, 28, 29], "data": {"1": 255, "27": 452, "28": 98, "29": 229}}}'
+)
+
+
+def legacy_query():
+    command = {'cmd': CMD_QUERY, 'pv': 0, 'sn': SN, 'msg': {'attr': list(QUERY_ATTRS)}}
+    return (json.dumps(command) + "\r\n").encode('utf-8')
+
+
+def legacy_set():
+    command = {'cmd': CMD_SET, 'pv': 0, 'sn': SN, 'msg': {'attr': [1], 'data': {'1': 255}}}
+    return (json.dumps(command) + "\r\n").encode('utf-8')
+
+
+def legacy_decode():
+    response = json.loads(REPLY.decode('utf-8'))
+    return response.get('res'), response['msg'].get('data', {})
+
+
+CASES = [
+    ("encode query", legacy_query, lambda: codec.encode_query(SN, QUERY_ATTRS)),
+    ("encode set", legacy_set, lambda: codec.encode_set(SN, True)),
+    ("decode reply", legacy_decode, lambda: codec.decode_reply(REPLY)),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=200000, help="calls per measurement")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"JSON backend: {codec.JSON_BACKEND}")
+    print(f"{'case':<14}  {'legacy ns':>10}  {'codec ns':>10}  {'speedup':>7}")
+    for name, legacy, fast in CASES:
+        assert legacy() == fast(), name
+        times = []
+        for func in (legacy, fast):
+            best = min(timeit.repeat(func, number=args.number, repeat=args.repeat))
+            times.append(best / args.number * 1e9)
+        print(f"{name:<14}  {times[0]:>10.0f}  {times[1]:>10.0f}  {times[0] / times[1]:>6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Throughput of the sharded polling engine versus worker count.
+
+Starts a process simulating ``--devices`` CozyLife plugs on loopback
+addresses (127.0.1.x, 127.0.2.x, ...), then runs ShardedPoller with a
+zero poll interval for each worker count and reports device queries per
+second.
+
+Run from the repository root (needs Home Assistant installed, like the
+integration itself):
+
+    python -m benchmarks.engine_benchmark --devices 256 --workers 1 2 4
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import random
+import time
+
+from custom_components.cozylife.engine import ShardedPoller
+
+PORT = 5555
+
+
+def device_ips(count):
+    """Return ``count`` distinct loopback addresses."""
+    return [f"127.0.{1 + i // 250}.{1 + i % 250}" for i in range(count)]
+
+
+async def _handle(reader, writer, latency):
+    """Answer every request line like a CozyLife plug."""
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            request = json.loads(line)
+            if latency:
+                await asyncio.sleep(latency)
+            reply = {"cmd": request["cmd"], "pv": 0, "sn": request["sn"], "res": 0, "msg": {}}
+            if request["cmd"] == 2:
+                reply["msg"] = {"attr": [1, 27, 28, 29], "data": {
+                    "1": 255,
+                    "27": random.randint(0, 10000),
+                    "28": random.randint(0, 2000),
+                    "29": random.randint(220, 240),
+                }}
+            writer.write((json.dumps(reply) + "\n").encode("utf-8"))
+            await writer.drain()
+    except (ConnectionError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+def _serve(ips, latency, ready):
+    """Process entry point serving every simulated device."""
+    async def main():
+        servers = [
+            await asyncio.start_server(lambda r, w: _handle(r, w, latency), ip, PORT)
+            for ip in ips
+        ]
+        ready.set()
+        await asyncio.gather(*(server.serve_forever() for server in servers))
+
+    asyncio.run(main())
+
+
+def run(ips, workers, duration, threads):
+    """Return device queries per second for one worker count."""
+    engine = ShardedPoller(workers=workers, interval=0, threads_per_worker=threads)
+    engine.start()
+    try:
+        for ip in ips:
+            engine.add_device(ip, PORT)
+        # Let every worker connect before measuring
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline and any(engine.get_state(ip) is None for ip in ips):
+            time.sleep(0.1)
+        start_polls, start = engine.polls, time.monotonic()
+        time.sleep(duration)
+        return (engine.polls - start_polls) / (time.monotonic() - start)
+    finally:
+        engine.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", type=int, default=256)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--threads", type=int, default=16, help="threads per worker")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per run")
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated reply delay (s)")
+    args = parser.parse_args()
+
+    ips = device_ips(args.devices)
+    ctx = multiprocessing.get_context("spawn")
+    ready = ctx.Event()
+    server = ctx.Process(target=_serve, args=(ips, args.latency, ready), daemon=True)
+    server.start()
+    ready.wait(30)
+
+    try:
+        baseline = None
+        print(f"{'workers':>7}  {'queries/s':>10}  {'speedup':>7}")
+        for workers in args.workers:
+            rate = run(ips, workers, args.duration, args.threads)
+            baseline = baseline or rate
+            print(f"{workers:>7}  {rate:>10.0f}  {rate / baseline:>6.2f}x")
+    finally:
+        server.terminate()
+        server.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,180 @@
 """Bộ tích hợp cho Ổ Cắm Cozy Life."""
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import Platform
+from homeassistant.const import (
+    Platform,
+    CONF_NAME,
+    CONF_IP_ADDRESS,
+    CONF_SCAN_INTERVAL,
+    EVENT_HOMEASSISTANT_STOP,
+)
 from homeassistant.core import HomeAssistant
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+import asyncio
 import logging
-from .const import DOMAIN
+from .const import (
+    DOMAIN,
+    DATA_FLEET,
+    DATA_ENGINE,
+    CONF_DEVICE_TYPE,
+    DEVICE_TYPE_SWITCH,
+    DEVICE_TYPE_HUB,
+    DATA_HUB,
+    DATA_SETUP_LOCK,
+    SIGNAL_OPTIONS_UPDATED,
+)
+from .cozylife_device import CozyLifeDevice
+from .engine import ShardedPoller
+from .fleet import FleetStore
+from .exporter import ReadingExporter
+from .options import get_inherited_options
 
 _LOGGER = logging.getLogger(__name__)
 
 PLATFORMS = [Platform.SWITCH, Platform.SENSOR]
 
+# ============================
+# Xuất dữ liệu thô ra file nhị phân (tùy chọn, tắt mặc định)
+ENABLE_EXPORT = False
+EXPORT_DIR = "cozylife_export"  # tương đối so với thư mục cấu hình HA
+EXPORT_MAX_SEGMENT_BYTES = 16 * 1024 * 1024
+EXPORT_MAX_SEGMENT_AGE = 3600  # giây
+EXPORT_MAX_TOTAL_BYTES = 512 * 1024 * 1024
+EXPORT_RETENTION = 7 * 24 * 3600  # giây
+EXPORT_FLUSH_INTERVAL = 10  # giây, ghi đệm và chỉ mục xuống đĩa
+
+# Bộ thăm dò đa tiến trình cho số lượng thiết bị rất lớn (tùy chọn, tắt mặc định)
+# Chu kỳ thăm dò lấy theo scan_interval chung (mục hub); scan_interval riêng
+# của thiết bị chỉ quyết định tần suất thực thể đọc kết quả đã thăm dò.
+ENABLE_ENGINE = False
+ENGINE_WORKERS = 4
+ENGINE_THREADS_PER_WORKER = 16
+# ============================
+
+
+def get_device(hass: HomeAssistant, ip):
+    """Trả về đối tượng giao tiếp với thiết bị, qua bộ thăm dò nếu đang bật."""
+    engine = hass.data[DOMAIN].get(DATA_ENGINE)
+    if engine is not None:
+        return engine.device(ip)
+    return CozyLifeDevice(ip)
+
+
+async def _async_start_engine(hass: HomeAssistant):
+    """Khởi chạy các tiến trình thăm dò (gọi khi giữ DATA_SETUP_LOCK)."""
+    engine = ShardedPoller(
+        workers=ENGINE_WORKERS,
+        interval=get_inherited_options(hass)[CONF_SCAN_INTERVAL],
+        threads_per_worker=ENGINE_THREADS_PER_WORKER,
+    )
+    await hass.async_add_executor_job(engine.start)
+    hass.data[DOMAIN][DATA_ENGINE] = engine
+    return engine
+
+
+async def _async_stop_engine(hass: HomeAssistant):
+    """Dừng các tiến trình thăm dò."""
+    engine = hass.data[DOMAIN].pop(DATA_ENGINE, None)
+    if engine is not None:
+        await hass.async_add_executor_job(engine.stop)
+
+
+async def _async_start_exporter(hass: HomeAssistant, fleet: FleetStore):
+    """Mở bộ xuất dữ liệu và gắn vào kho trạng thái (gọi khi giữ DATA_SETUP_LOCK)."""
+    exporter = ReadingExporter(
+        hass.config.path(EXPORT_DIR),
+        max_segment_bytes=EXPORT_MAX_SEGMENT_BYTES,
+        max_segment_age=EXPORT_MAX_SEGMENT_AGE,
+        max_total_bytes=EXPORT_MAX_TOTAL_BYTES,
+        retention=EXPORT_RETENTION,
+        flush_interval=EXPORT_FLUSH_INTERVAL,
+    )
+    await hass.async_add_executor_job(exporter.open)
+    fleet.exporter = exporter
+
+
+async def _async_stop_exporter(hass: HomeAssistant, fleet: FleetStore):
+    """Tách bộ xuất dữ liệu khỏi kho trạng thái và đóng file."""
+    exporter, fleet.exporter = fleet.exporter, None
+    if exporter is not None:
+        await hass.async_add_executor_job(exporter.close)
+
 async def async_setup(hass: HomeAssistant, config: dict):
     """Thiết lập thành phần Ổ Cắm Cozy Life."""
     hass.data.setdefault(DOMAIN, {})
+
+    async def _async_shutdown(event):
+        async with _setup_lock(hass):
+            fleet = hass.data[DOMAIN].get(DATA_FLEET)
+            if fleet is not None:
+                await _async_stop_exporter(hass, fleet)
+            await _async_stop_engine(hass)
+
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, _async_shutdown)
     return True
 
+def _setup_lock(hass: HomeAssistant):
+    """Khóa dùng chung khi khởi chạy/dừng bộ thăm dò và bộ xuất dữ liệu.
+
+    HA thiết lập đồng thời mọi mục cấu hình nên việc kiểm tra rồi khởi
+    chạy phải nằm trong cùng một khóa.
+    """
+    return hass.data[DOMAIN].setdefault(DATA_SETUP_LOCK, asyncio.Lock())
+
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
     """Thiết lập Ổ Cắm Cozy Life từ mục cấu hình."""
     hass.data.setdefault(DOMAIN, {})
+    fleet = hass.data[DOMAIN].setdefault(DATA_FLEET, FleetStore())
     hass.data[DOMAIN][entry.entry_id] = entry.data
 
+    if entry.data.get(CONF_DEVICE_TYPE) == DEVICE_TYPE_SWITCH:
+        ip = entry.data[CONF_IP_ADDRESS]
+        fleet.register(ip, entry.data.get(CONF_NAME) or ip)
+        async with _setup_lock(hass):
+            if ENABLE_EXPORT and fleet.exporter is None:
+                await _async_start_exporter(hass, fleet)
+            if ENABLE_ENGINE:
+                engine = hass.data[DOMAIN].get(DATA_ENGINE)
+                if engine is None:
+                    engine = await _async_start_engine(hass)
+                engine.add_device(ip)
+
+    entry.async_on_unload(entry.add_update_listener(_async_options_updated))
+
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+
+    if entry.data.get(CONF_DEVICE_TYPE) == DEVICE_TYPE_HUB:
+        # Cảm biến tổng hợp cần đủ thuộc tính: các thiết bị hỏi lại toàn bộ
+        hass.data[DOMAIN][DATA_HUB] = entry.entry_id
+        async_dispatcher_send(hass, SIGNAL_OPTIONS_UPDATED)
     return True
 
+async def _async_options_updated(hass: HomeAssistant, entry: ConfigEntry):
+    """Báo cho mọi nền tảng áp dụng tùy chọn mới mà không cần nạp lại.
+
+    Tùy chọn của mục hub là mặc định cho mọi thiết bị nên tín hiệu
+    được gửi chung, mỗi nền tảng tự tính lại tùy chọn hiệu lực của mình.
+    """
+    engine = hass.data[DOMAIN].get(DATA_ENGINE)
+    if engine is not None:
+        engine.set_interval(get_inherited_options(hass)[CONF_SCAN_INTERVAL])
+    async_dispatcher_send(hass, SIGNAL_OPTIONS_UPDATED)
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
     """Dỡ bỏ mục cấu hình."""
     unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
     if unload_ok:
         hass.data[DOMAIN].pop(entry.entry_id)
+        if entry.data.get(CONF_DEVICE_TYPE) == DEVICE_TYPE_HUB:
+            hass.data[DOMAIN].pop(DATA_HUB, None)
+            async_dispatcher_send(hass, SIGNAL_OPTIONS_UPDATED)
+        if entry.data.get(CONF_DEVICE_TYPE) == DEVICE_TYPE_SWITCH:
+            fleet = hass.data[DOMAIN][DATA_FLEET]
+            fleet.unregister(entry.data[CONF_IP_ADDRESS])
+            async with _setup_lock(hass):
+                engine = hass.data[DOMAIN].get(DATA_ENGINE)
+                if engine is not None:
+                    engine.remove_device(entry.data[CONF_IP_ADDRESS])
+                if len(fleet) == 0:
+                    await _async_stop_exporter(hass, fleet)
+                    await _async_stop_engine(hass)
     return unload_ok
\ No newline at end of file
@@ -0,0 +1,81 @@
+"""Encoding and decoding of CozyLife protocol messages.
+
+Requests are built from pre-encoded byte templates, so only the sequence
+number and the values are spliced in per message. The templates produce
+exactly the bytes of ``json.dumps(command) + "\\r\\n"``, keeping the wire
+format unchanged. Replies are decoded with orjson when it is installed.
+"""
+from functools import lru_cache
+import json
+
+from .const import CMD_SET, CMD_QUERY, CMD_INFO, QUERY_ATTRS
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+if orjson is not None:
+    _loads = orjson.loads
+    JSON_BACKEND = "orjson"
+else:
+    _loads = json.loads
+    JSON_BACKEND = "json"
+
+# Decoding failures raised by both backends (orjson.JSONDecodeError and
+# UnicodeDecodeError are ValueError subclasses)
+DecodeError = ValueError
+
+_TERMINATOR = b"\r\n"
+
+
+def _prefix(cmd):
+    return f'{{"cmd": {cmd}, "pv": 0, "sn": "'.encode("ascii")
+
+
+_SET_PREFIX = _prefix(CMD_SET)
+_SET_ON = b'", "msg": {"attr": [1], "data": {"1": 255}}}' + _TERMINATOR
+_SET_OFF = b'", "msg": {"attr": [1], "data": {"1": 0}}}' + _TERMINATOR
+_QUERY_PREFIX = _prefix(CMD_QUERY)
+_INFO_PREFIX = _prefix(CMD_INFO)
+_INFO_SUFFIX = b'", "msg": {}}' + _TERMINATOR
+
+
+@lru_cache(maxsize=32)
+def _query_suffix(attrs):
+    return (
+        b'", "msg": {"attr": '
+        + json.dumps(list(attrs)).encode("ascii")
+        + b"}}"
+        + _TERMINATOR
+    )
+
+
+def encode_query(sn, attrs=QUERY_ATTRS):
+    """Return the CMD_QUERY request for the given attributes."""
+    return b"".join((_QUERY_PREFIX, sn.encode("ascii"), _query_suffix(tuple(attrs))))
+
+
+def encode_set(sn, state):
+    """Return the CMD_SET request switching attribute 1 on or off."""
+    return b"".join((_SET_PREFIX, sn.encode("ascii"), _SET_ON if state else _SET_OFF))
+
+
+def encode_info(sn):
+    """Return the CMD_INFO request."""
+    return b"".join((_INFO_PREFIX, sn.encode("ascii"), _INFO_SUFFIX))
+
+
+def decode_reply(line):
+    """Decode one reply line into ``(res, data)``.
+
+    ``data`` is the ``msg.data`` object (``{}`` when the message has no
+    data) or None when the reply carries no message. Raises DecodeError on
+    malformed input.
+    """
+    reply = _loads(line)
+    if not isinstance(reply, dict):
+        raise DecodeError("reply is not a JSON object")
+    msg = reply.get('msg')
+    data = msg.get('data', {}) if msg and isinstance(msg, dict) else None
+    return reply.get('res'), data
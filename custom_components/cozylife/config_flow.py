@@ -6,6 +6,9 @@ Chức năng chính:
 - Cho phép người dùng thêm thiết bị thủ công (nhập IP), từ file JSON hoặc từ liên kết JSON online.
 - Kiểm tra kết nối trước khi thêm thiết bị.
 - Đảm bảo mỗi IP chỉ thêm một lần (unique_id).
+- Cho phép tạo một mục "hub" duy nhất chứa các cảm biến tổng hợp toàn bộ ổ cắm.
+- Options flow: chỉnh chu kỳ, thời gian chờ, số lỗi tối đa và cảm biến được bật
+  cho từng thiết bị, hoặc mặc định cho cả hệ thống qua mục hub; áp dụng ngay.
 """
 
 from __future__ import annotations
@@ -13,7 +16,8 @@ from __future__ import annotations
 # Nhập các thư viện cần thiết
 import voluptuous as vol
 from homeassistant import config_entries
-from homeassistant.const import CONF_NAME, CONF_IP_ADDRESS
+from homeassistant.const import CONF_NAME, CONF_IP_ADDRESS, CONF_SCAN_INTERVAL, CONF_TIMEOUT
+from homeassistant.core import callback
 import homeassistant.helpers.config_validation as cv
 from typing import Any
 import os
@@ -22,8 +26,27 @@ import logging
 import aiohttp
 
 # Nhập các hằng số và lớp điều khiển thiết bị CozyLife
-from .const import DOMAIN, CONF_DEVICE_TYPE, DEVICE_TYPE_SWITCH
+from .const import (
+    DOMAIN,
+    CONF_DEVICE_TYPE,
+    DEVICE_TYPE_SWITCH,
+    DEVICE_TYPE_HUB,
+    CONF_MAX_ERRORS,
+    CONF_CONNECT_TIMEOUT,
+    CONF_READ_TIMEOUT,
+    CONF_CONNECT_RETRY_DELAY,
+    CONF_ENABLE_SENSOR_POWER,
+    CONF_ENABLE_SENSOR_VOLTAGE,
+    CONF_ENABLE_SENSOR_CURRENT,
+    CONF_ENABLE_SENSOR_ENERGY,
+    CONF_FLEET_INTERVAL,
+    CONF_FLEET_TOP_N,
+    CONF_FLEET_MAX_AGE,
+    DEFAULT_DEVICE_OPTIONS,
+    DEFAULT_HUB_OPTIONS,
+)
 from .cozylife_device import CozyLifeDevice
+from .options import get_device_options, get_inherited_options
 
 # Khởi tạo logger
 _LOGGER = logging.getLogger(__name__)
@@ -32,12 +55,53 @@ _LOGGER = logging.getLogger(__name__)
 CHOICE_MANUAL = "manual"
 CHOICE_FROM_FILE = "from_file"
 CHOICE_FROM_LINK = "from_link"
+CHOICE_HUB = "hub"
+
+
+def _device_options_schema(values: dict[str, Any]) -> dict:
+    """Các trường tùy chọn của thiết bị, mặc định là giá trị đang dùng."""
+    return {
+        vol.Required(CONF_SCAN_INTERVAL, default=values[CONF_SCAN_INTERVAL]):
+            vol.All(vol.Coerce(int), vol.Range(min=1, max=3600)),
+        vol.Required(CONF_TIMEOUT, default=values[CONF_TIMEOUT]):
+            vol.All(vol.Coerce(int), vol.Range(min=1, max=60)),
+        vol.Required(CONF_MAX_ERRORS, default=values[CONF_MAX_ERRORS]):
+            vol.All(vol.Coerce(int), vol.Range(min=1, max=100)),
+        vol.Required(CONF_CONNECT_TIMEOUT, default=values[CONF_CONNECT_TIMEOUT]):
+            vol.All(vol.Coerce(float), vol.Range(min=0.5, max=30)),
+        vol.Required(CONF_READ_TIMEOUT, default=values[CONF_READ_TIMEOUT]):
+            vol.All(vol.Coerce(float), vol.Range(min=0.5, max=30)),
+        vol.Required(CONF_CONNECT_RETRY_DELAY, default=values[CONF_CONNECT_RETRY_DELAY]):
+            vol.All(vol.Coerce(int), vol.Range(min=0, max=3600)),
+        vol.Required(CONF_ENABLE_SENSOR_POWER, default=values[CONF_ENABLE_SENSOR_POWER]): bool,
+        vol.Required(CONF_ENABLE_SENSOR_VOLTAGE, default=values[CONF_ENABLE_SENSOR_VOLTAGE]): bool,
+        vol.Required(CONF_ENABLE_SENSOR_CURRENT, default=values[CONF_ENABLE_SENSOR_CURRENT]): bool,
+        vol.Required(CONF_ENABLE_SENSOR_ENERGY, default=values[CONF_ENABLE_SENSOR_ENERGY]): bool,
+    }
+
+
+def _hub_options_schema(values: dict[str, Any]) -> dict:
+    """Các trường tùy chọn riêng của mục hub."""
+    return {
+        vol.Required(CONF_FLEET_INTERVAL, default=values[CONF_FLEET_INTERVAL]):
+            vol.All(vol.Coerce(int), vol.Range(min=1, max=3600)),
+        vol.Required(CONF_FLEET_TOP_N, default=values[CONF_FLEET_TOP_N]):
+            vol.All(vol.Coerce(int), vol.Range(min=1, max=50)),
+        vol.Required(CONF_FLEET_MAX_AGE, default=values[CONF_FLEET_MAX_AGE]):
+            vol.All(vol.Coerce(int), vol.Range(min=5, max=86400)),
+    }
 
 class CozyLifeConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     """Xử lý quy trình cấu hình cho ổ cắm Cozy Life."""
 
     VERSION = 1  # Phiên bản schema config flow
 
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry: config_entries.ConfigEntry):
+        """Trả về options flow cho mục cấu hình."""
+        return CozyLifeOptionsFlow()
+
     async def async_step_user(self, user_input: dict[str, Any] | None = None):
         """Bắt đầu flow: chuyển tới bước lựa chọn cấu hình."""
         return await self.async_step_start(user_input)
@@ -51,6 +115,8 @@ class CozyLifeConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 return await self.async_step_import_file()
             elif user_input["mode"] == CHOICE_FROM_LINK:
                 return await self.async_step_import_link()
+            elif user_input["mode"] == CHOICE_HUB:
+                return await self.async_step_hub()
 
         # Hiển thị form lựa chọn cách thêm thiết bị
         return self.async_show_form(
@@ -59,7 +125,8 @@ class CozyLifeConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 vol.Required("mode", default=CHOICE_MANUAL): vol.In({
                     CHOICE_MANUAL: "Nhập thủ công",
                     CHOICE_FROM_FILE: "Tải từ file JSON",
-                    CHOICE_FROM_LINK: "Tải từ đường link"
+                    CHOICE_FROM_LINK: "Tải từ đường link",
+                    CHOICE_HUB: "Cảm biến tổng hợp (hub)"
                 })
             }),
         )
@@ -101,6 +168,16 @@ class CozyLifeConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             errors=errors,
         )
 
+    async def async_step_hub(self, user_input: dict[str, Any] | None = None):
+        """Bước tạo mục hub chứa các cảm biến tổng hợp (chỉ một mục)."""
+        await self.async_set_unique_id(f"{DOMAIN}_{DEVICE_TYPE_HUB}")
+        self._abort_if_unique_id_configured()
+
+        return self.async_create_entry(
+            title="CozyLife Fleet",
+            data={CONF_DEVICE_TYPE: DEVICE_TYPE_HUB}
+        )
+
     async def async_step_import_file(self):
         """Bước nhập thiết bị từ file JSON nội bộ (devices.json)."""
         try:
@@ -189,4 +266,34 @@ class CozyLifeConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
 
     async def async_step_import(self, import_config):
         """Xử lý khi import từ configuration.yaml (nếu có hỗ trợ YAML)."""
-        return await self.async_step_manual(import_config)
\ No newline at end of file
+        return await self.async_step_manual(import_config)
+
+
+class CozyLifeOptionsFlow(config_entries.OptionsFlow):
+    """Chỉnh tùy chọn khi đang chạy cho một thiết bị hoặc cho mục hub."""
+
+    async def async_step_init(self, user_input: dict[str, Any] | None = None):
+        """Hiển thị và lưu tùy chọn."""
+        entry = self.config_entry
+
+        if entry.data.get(CONF_DEVICE_TYPE) == DEVICE_TYPE_HUB:
+            # Mục hub: tùy chọn riêng + mặc định cho mọi thiết bị
+            inherited = {**DEFAULT_DEVICE_OPTIONS, **DEFAULT_HUB_OPTIONS}
+            current = {**inherited, **entry.options}
+            schema = {**_hub_options_schema(current), **_device_options_schema(current)}
+        else:
+            inherited = get_inherited_options(self.hass)
+            current = get_device_options(self.hass, entry)
+            schema = _device_options_schema(current)
+
+        if user_input is not None:
+            # Chỉ lưu các giá trị khác mặc định để thiết bị vẫn theo mục hub
+            return self.async_create_entry(
+                title="",
+                data={
+                    key: value for key, value in user_input.items()
+                    if value != inherited.get(key)
+                },
+            )
+
+        return self.async_show_form(step_id="init", data_schema=vol.Schema(schema))
@@ -3,6 +3,8 @@ from homeassistant.const import (
     CONF_NAME,
     CONF_IP_ADDRESS,
     CONF_TYPE,
+    CONF_SCAN_INTERVAL,
+    CONF_TIMEOUT,
 )
 
 DOMAIN = "cozylife"
@@ -12,10 +14,68 @@ CONF_DEVICE_IP = CONF_IP_ADDRESS
 CONF_DEVICE_TYPE = CONF_TYPE
 
 DEVICE_TYPE_SWITCH = "switch"
+DEVICE_TYPE_HUB = "hub"
+
+# Khóa trong hass.data[DOMAIN] cho kho trạng thái dùng chung
+DATA_FLEET = "fleet"
+DATA_ENGINE = "engine"
+DATA_HUB = "hub"  # có mặt khi mục hub đang chạy
+DATA_SETUP_LOCK = "setup_lock"  # khởi chạy/dừng tài nguyên dùng chung
+
+# Tín hiệu phát ra khi tùy chọn của một mục bất kỳ thay đổi
+SIGNAL_OPTIONS_UPDATED = f"{DOMAIN}_options_updated"
+
+# Tùy chọn chỉnh được khi đang chạy (options flow)
+CONF_MAX_ERRORS = "max_errors"
+CONF_CONNECT_TIMEOUT = "connect_timeout"
+CONF_READ_TIMEOUT = "read_timeout"
+CONF_CONNECT_RETRY_DELAY = "connect_retry_delay"
+CONF_ENABLE_SENSOR_POWER = "enable_sensor_power"
+CONF_ENABLE_SENSOR_VOLTAGE = "enable_sensor_voltage"
+CONF_ENABLE_SENSOR_CURRENT = "enable_sensor_current"
+CONF_ENABLE_SENSOR_ENERGY = "enable_sensor_energy"
+CONF_FLEET_INTERVAL = "fleet_interval"
+CONF_FLEET_TOP_N = "fleet_top_n"
+CONF_FLEET_MAX_AGE = "fleet_max_age"
+
+DEFAULT_SCAN_INTERVAL = 5  # giây
+DEFAULT_TIMEOUT = 5  # giây
+DEFAULT_MAX_ERRORS = 3
+DEFAULT_CONNECT_TIMEOUT = 3  # giây
+DEFAULT_READ_TIMEOUT = 2  # giây
+DEFAULT_CONNECT_RETRY_DELAY = 30  # giây giữa các lần thử kết nối lại
+
+# Giá trị mặc định cho từng thiết bị; mục hub có thể ghi đè cho cả hệ thống
+DEFAULT_DEVICE_OPTIONS = {
+    CONF_SCAN_INTERVAL: DEFAULT_SCAN_INTERVAL,
+    CONF_TIMEOUT: DEFAULT_TIMEOUT,
+    CONF_MAX_ERRORS: DEFAULT_MAX_ERRORS,
+    CONF_CONNECT_TIMEOUT: DEFAULT_CONNECT_TIMEOUT,
+    CONF_READ_TIMEOUT: DEFAULT_READ_TIMEOUT,
+    CONF_CONNECT_RETRY_DELAY: DEFAULT_CONNECT_RETRY_DELAY,
+    CONF_ENABLE_SENSOR_POWER: True,
+    CONF_ENABLE_SENSOR_VOLTAGE: False,
+    CONF_ENABLE_SENSOR_CURRENT: False,
+    CONF_ENABLE_SENSOR_ENERGY: True,
+}
+
+# Giá trị mặc định riêng của mục hub (cảm biến tổng hợp)
+DEFAULT_HUB_OPTIONS = {
+    CONF_FLEET_INTERVAL: 5,  # giây
+    CONF_FLEET_TOP_N: 5,  # số thiết bị tiêu thụ nhiều nhất được liệt kê
+    CONF_FLEET_MAX_AGE: 60,  # giây; số liệu cũ hơn coi như mất kết nối
+}
 
 # Device specific constants
 SWITCH_TYPE_CODE = '00'
 
 CMD_INFO = 0
 CMD_QUERY = 2
-CMD_SET = 3
\ No newline at end of file
+CMD_SET = 3
+
+# Thuộc tính được hỏi khi truy vấn trạng thái
+ATTR_SWITCH = 1
+ATTR_CURRENT = 27
+ATTR_POWER = 28
+ATTR_VOLTAGE = 29
+QUERY_ATTRS = [ATTR_SWITCH, ATTR_CURRENT, ATTR_POWER, ATTR_VOLTAGE]
\ No newline at end of file
@@ -1,9 +1,14 @@
 """CozyLife device control class."""
 import socket
-import json
 import time
 import logging
-from .const import CMD_SET, CMD_QUERY, CMD_INFO
+from . import codec
+from .const import (
+    QUERY_ATTRS,
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_READ_TIMEOUT,
+    DEFAULT_CONNECT_RETRY_DELAY,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -15,10 +20,23 @@ class CozyLifeDevice:
         self.ip = ip
         self.port = port
         self._socket = None
-        self._connect_timeout = 3
-        self._read_timeout = 2
+        self._connect_timeout = DEFAULT_CONNECT_TIMEOUT
+        self._read_timeout = DEFAULT_READ_TIMEOUT
         self._last_connect_attempt = 0
-        self._connect_retry_delay = 30  # Seconds between connection attempts
+        self._connect_retry_delay = DEFAULT_CONNECT_RETRY_DELAY  # Seconds between connection attempts
+        self._query_attrs = tuple(QUERY_ATTRS)
+
+    def configure(self, connect_timeout=None, read_timeout=None,
+                  connect_retry_delay=None, query_attrs=None):
+        """Update timeouts and the queried attributes at runtime."""
+        if connect_timeout is not None:
+            self._connect_timeout = connect_timeout
+        if read_timeout is not None:
+            self._read_timeout = read_timeout
+        if connect_retry_delay is not None:
+            self._connect_retry_delay = connect_retry_delay
+        if query_attrs is not None:
+            self._query_attrs = tuple(query_attrs)
 
     def test_connection(self):
         """Test if we can connect to the device."""
@@ -77,36 +95,28 @@ class CozyLifeDevice:
 
         try:
             self._socket.settimeout(self._read_timeout)
-            data = ""
+            data = b""
             while True:
-                try:
-                    chunk = self._socket.recv(1024).decode('utf-8')
-                    if not chunk:
-                        break
-                    data += chunk
-                    if '\n' in data:
-                        # Take only the first line as in original code
-                        json_data = data.split('\n')[0].strip()
-                        if not json_data:  # Skip empty lines
-                            data = data.split('\n', 1)[1] if '\n' in data else ""
-                            continue
-                        
-                        try:
-                            return json.loads(json_data)
-                        except json.JSONDecodeError:
-                            # Log the invalid JSON for debugging but don't crash
-                            _LOGGER.debug(
-                                f"Received invalid JSON from {self.ip}, skipping. "
-                                f"Length: {len(json_data)} chars"
-                            )
-                            # Move to next line if this one is invalid
-                            data = data.split('\n', 1)[1] if '\n' in data else ""
-                            continue
-                except UnicodeDecodeError:
-                    _LOGGER.debug(f"Received invalid UTF-8 data from {self.ip}, skipping")
-                    data = ""
-                    continue
-                    
+                chunk = self._socket.recv(1024)
+                if not chunk:
+                    break
+                data += chunk
+                while b'\n' in data:
+                    # Take the first non-empty, valid line as in original code
+                    line, data = data.split(b'\n', 1)
+                    line = line.strip()
+                    if not line:  # Skip empty lines
+                        continue
+
+                    try:
+                        return codec.decode_reply(line)
+                    except codec.DecodeError:
+                        # Log the invalid JSON for debugging but don't crash
+                        _LOGGER.debug(
+                            f"Received invalid JSON from {self.ip}, skipping. "
+                            f"Length: {len(line)} bytes"
+                        )
+
         except socket.timeout:
             _LOGGER.debug(f"Read timeout from {self.ip}")
         except ConnectionResetError:
@@ -118,14 +128,13 @@ class CozyLifeDevice:
         
         return None
 
-    def _send_message(self, command):
-        """Send message to device."""
+    def _send_message(self, payload):
+        """Send an encoded message to device and return the decoded reply."""
         if not self._ensure_connection():
             return None
 
         try:
-            payload = json.dumps(command) + "\r\n"
-            self._socket.send(payload.encode('utf-8'))
+            self._socket.send(payload)
             return self._read_response()
         except Exception as e:
             _LOGGER.debug(f"Failed to communicate with {self.ip}: {e}")
@@ -134,31 +143,17 @@ class CozyLifeDevice:
 
     def send_command(self, state):
         """Send command to device."""
-        command = {
-            'cmd': CMD_SET,
-            'pv': 0,
-            'sn': self._get_sn(),
-            'msg': {
-                'attr': [1],
-                'data': {
-                    '1': 255 if state else 0
-                }
-            }
-        }
-        response = self._send_message(command)
-        return response is not None and response.get('res') == 0
+        response = self._send_message(codec.encode_set(self._get_sn(), state))
+        return response is not None and response[0] == 0
 
     def query_state(self):
         """Query device state."""
-        command = {
-            'cmd': CMD_QUERY,
-            'pv': 0,
-            'sn': self._get_sn(),
-            'msg': {
-                'attr': [1, 27, 28, 29]
-            }
-        }
-        response = self._send_message(command)
-        if response and response.get('msg'):
-            return response['msg'].get('data', {})
+        response = self._send_message(codec.encode_query(self._get_sn(), self._query_attrs))
+        if response is not None:
+            return response[1]
         return None
+
+    def query_sample(self):
+        """Query device state, returning ``(state, timestamp)``."""
+        state = self.query_state()
+        return state, time.time()
@@ -0,0 +1,34 @@
+"""Energy accumulation from instantaneous power readings."""
+
+_WS_PER_KWH = 3_600_000.0
+
+
+class EnergyAccumulator:
+    """Integrate power samples (W) into energy (kWh) with the trapezoid rule.
+
+    Intervals longer than ``max_gap`` seconds are not integrated, so an
+    outage or a stalled poller never credits energy that was not measured.
+    """
+
+    def __init__(self, max_gap=60.0, total=0.0):
+        """Initialize the accumulator."""
+        self.max_gap = max_gap
+        self.total = total
+        self._last_power = None
+        self._last_time = None
+
+    def add(self, power, timestamp):
+        """Add a power sample taken at ``timestamp`` (seconds)."""
+        power = max(float(power), 0.0)
+        if self._last_time is not None:
+            elapsed = timestamp - self._last_time
+            # Duplicate samples and clock jumps backwards start a new interval
+            if 0 < elapsed <= self.max_gap:
+                self.total += (self._last_power + power) / 2.0 * elapsed / _WS_PER_KWH
+        self._last_power = power
+        self._last_time = timestamp
+
+    def break_series(self):
+        """Forget the last sample so the next one starts a new series."""
+        self._last_power = None
+        self._last_time = None
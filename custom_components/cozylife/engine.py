@@ -0,0 +1,407 @@
+"""Sharded multi-process polling engine for large CozyLife fleets.
+
+Devices are spread over a pool of worker processes. Each worker owns the
+sockets of its shard, polls them on a fixed interval, switches them on
+request without waiting for the current round and sends back one
+batch per round containing only the devices whose reading changed. The
+main process keeps the latest reading of every device so entities can
+read it through ``EngineDevice`` without doing any I/O themselves. A
+reading is dated by the last round of its shard, since every round polls
+every device of the shard.
+"""
+import itertools
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .cozylife_device import CozyLifeDevice
+
+_LOGGER = logging.getLogger(__name__)
+
+# Attributes carried by a delta, in order
+ENGINE_ATTRS = ('1', '27', '28', '29')
+
+# Threads of each worker sending switch commands
+COMMAND_THREADS = 4
+
+# Main process -> worker
+_OP_ADD = "add"
+_OP_REMOVE = "remove"
+_OP_SET = "set"
+_OP_CONFIGURE = "configure"
+_OP_INTERVAL = "interval"
+_OP_STOP = "stop"
+
+# Worker -> main process
+_MSG_BATCH = "batch"
+_MSG_REPLY = "reply"
+
+
+def _query(entry):
+    """Query one device, returning the delta payload or None on failure."""
+    device, lock = entry
+    with lock:
+        try:
+            data = device.query_state()
+        except Exception:
+            return None
+    if data is None:
+        return None
+    return tuple(data.get(key) for key in ENGINE_ATTRS)
+
+
+def _send(entry, state, request_id, results):
+    """Switch one device and report the result to the main process."""
+    device, lock = entry
+    with lock:
+        try:
+            ok = device.send_command(state)
+        except Exception:
+            ok = False
+    results.put((_MSG_REPLY, request_id, bool(ok)))
+
+
+def _close(entry):
+    """Close the socket of a removed device once its last query is done."""
+    device, lock = entry
+    with lock:
+        device._close_connection()
+
+
+def _poll_rounds(shard, devices, devices_lock, results, settings, threads, stopped):
+    """Poll every device of the shard once per interval until stopped.
+
+    ``settings["interval"]`` is read at the start of every round.
+    """
+    last = {}  # device id -> last reading sent to the main process
+    pool = ThreadPoolExecutor(max_workers=threads)
+    next_round = time.monotonic()
+    try:
+        while not stopped.wait(max(0.0, next_round - time.monotonic())):
+            next_round = time.monotonic() + settings["interval"]
+            started = time.time()
+            with devices_lock:
+                polled = list(devices.items())
+            deltas = []
+            readings = pool.map(_query, [entry for _, entry in polled])
+            for (device_id, _), reading in zip(polled, readings):
+                if last.get(device_id, False) != reading:
+                    last[device_id] = reading
+                    deltas.append((device_id, reading))
+            # Device ids are never reused: forget the removed ones
+            for device_id in set(last).difference(device_id for device_id, _ in polled):
+                del last[device_id]
+            results.put((_MSG_BATCH, shard, started, time.time(), len(polled), deltas))
+    finally:
+        pool.shutdown(wait=False)
+
+
+def _worker_main(shard, commands, results, interval, threads):
+    """Entry point of a worker process.
+
+    Polling rounds run on their own thread so commands are handled as soon
+    as they arrive; a per-device lock keeps a command and a query from
+    sharing the socket at the same time.
+    """
+    devices = {}  # device id -> (CozyLifeDevice, threading.Lock)
+    devices_lock = threading.Lock()
+    stopped = threading.Event()
+    settings = {"interval": interval}
+    command_pool = ThreadPoolExecutor(max_workers=COMMAND_THREADS)
+    poller = threading.Thread(
+        target=_poll_rounds,
+        args=(shard, devices, devices_lock, results, settings, threads, stopped),
+        name=f"cozylife-engine-{shard}-poller",
+        daemon=True,
+    )
+    poller.start()
+
+    try:
+        while True:
+            msg = commands.get()
+            op = msg[0]
+            if op == _OP_STOP:
+                return
+            if op == _OP_ADD:
+                with devices_lock:
+                    devices[msg[1]] = (CozyLifeDevice(msg[2], msg[3]), threading.Lock())
+            elif op == _OP_REMOVE:
+                with devices_lock:
+                    entry = devices.pop(msg[1], None)
+                if entry is not None:
+                    command_pool.submit(_close, entry)
+            elif op == _OP_SET:
+                with devices_lock:
+                    entry = devices.get(msg[1])
+                if entry is None:
+                    results.put((_MSG_REPLY, msg[3], False))
+                else:
+                    command_pool.submit(_send, entry, msg[2], msg[3], results)
+            elif op == _OP_CONFIGURE:
+                with devices_lock:
+                    entry = devices.get(msg[1])
+                if entry is not None:
+                    entry[0].configure(**msg[2])
+            elif op == _OP_INTERVAL:
+                settings["interval"] = msg[1]
+    finally:
+        stopped.set()
+        # Do not block process exit on batches the main process won't read
+        results.cancel_join_thread()
+        command_pool.shutdown(wait=False)
+        with devices_lock:
+            for device, _ in devices.values():
+                device._close_connection()
+
+
+class ShardedPoller:
+    """Spread device polling over a pool of worker processes."""
+
+    def __init__(self, workers=2, interval=5.0, threads_per_worker=16, max_age=None):
+        """Initialize the engine; call ``start()`` before adding devices."""
+        self.workers = max(1, int(workers))
+        self.interval = interval
+        self.threads_per_worker = threads_per_worker
+        # Readings of a shard that stopped reporting are considered lost
+        self._auto_max_age = max_age is None
+        self.max_age = 3 * interval + 5 if max_age is None else max_age
+        self.polls = 0  # total device queries reported by the workers
+        self._ctx = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        self._processes = []
+        self._commands = []
+        self._results = None
+        self._reader = None
+        self._running = False
+        self._ids = itertools.count()
+        self._devices = {}  # ip -> (shard, device id)
+        self._readings = {}  # device id -> reading tuple or None
+        self._switched = {}  # device id -> (time, attribute 1) of the last command
+        self._shard_seen = [0.0] * self.workers
+        self._shard_load = [0] * self.workers
+        self._replies = {}  # request id -> [threading.Event, result]
+        self._request_ids = itertools.count()
+
+    @property
+    def running(self):
+        """Return True while the worker processes are running."""
+        return self._running
+
+    def start(self):
+        """Spawn the worker processes and the result reader thread."""
+        if self._running:
+            return
+        self._results = self._ctx.Queue()
+        for shard in range(self.workers):
+            commands = self._ctx.Queue()
+            process = self._ctx.Process(
+                target=_worker_main,
+                args=(shard, commands, self._results, self.interval, self.threads_per_worker),
+                name=f"cozylife-engine-{shard}",
+                daemon=True,
+            )
+            process.start()
+            self._commands.append(commands)
+            self._processes.append(process)
+        self._running = True
+        self._reader = threading.Thread(
+            target=self._read_results, name="cozylife-engine-reader", daemon=True
+        )
+        self._reader.start()
+
+    def stop(self, timeout=5.0):
+        """Stop the workers and release every pending command."""
+        if not self._running:
+            return
+        self._running = False
+        for commands in self._commands:
+            commands.put((_OP_STOP,))
+        deadline = time.monotonic() + timeout
+        for process in self._processes:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
+                process.join(1.0)
+        self._reader.join(timeout)
+        for commands in self._commands:
+            commands.close()
+        self._results.close()
+        self._processes = []
+        self._commands = []
+        self._results = None
+        self._reader = None
+        with self._lock:
+            for reply in self._replies.values():
+                reply[0].set()
+            self._replies.clear()
+            self._readings.clear()
+            self._switched.clear()
+            self._devices.clear()
+            self._shard_load = [0] * self.workers
+            self._shard_seen = [0.0] * self.workers
+
+    def _read_results(self):
+        """Apply batches and command replies sent by the workers."""
+        while self._running:
+            try:
+                msg = self._results.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+            with self._lock:
+                if msg[0] == _MSG_BATCH:
+                    _, shard, started, timestamp, polled, deltas = msg
+                    self._shard_seen[shard] = timestamp
+                    self.polls += polled
+                    for device_id, reading in deltas:
+                        if device_id not in self._readings:
+                            continue
+                        switched = self._switched.get(device_id)
+                        if switched is not None and switched[0] > started:
+                            # Queried before the command may have run: keep
+                            # the switched state until the next round
+                            if reading is not None:
+                                reading = (switched[1],) + reading[1:]
+                        else:
+                            self._switched.pop(device_id, None)
+                        self._readings[device_id] = reading
+                elif msg[0] == _MSG_REPLY:
+                    reply = self._replies.pop(msg[1], None)
+                    if reply is not None:
+                        reply[1] = msg[2]
+                        reply[0].set()
+
+    def add_device(self, ip, port=5555):
+        """Assign a device to the least loaded shard."""
+        with self._lock:
+            if ip in self._devices:
+                return
+            shard = self._shard_load.index(min(self._shard_load))
+            device_id = next(self._ids)
+            self._devices[ip] = (shard, device_id)
+            self._readings[device_id] = None
+            self._shard_load[shard] += 1
+        self._commands[shard].put((_OP_ADD, device_id, ip, port))
+
+    def remove_device(self, ip):
+        """Stop polling a device."""
+        with self._lock:
+            entry = self._devices.pop(ip, None)
+            if entry is None:
+                return
+            shard, device_id = entry
+            self._readings.pop(device_id, None)
+            self._switched.pop(device_id, None)
+            self._shard_load[shard] -= 1
+        if self._running:
+            self._commands[shard].put((_OP_REMOVE, device_id))
+
+    def set_interval(self, interval):
+        """Change the polling interval of every worker."""
+        if interval == self.interval:
+            return
+        self.interval = interval
+        if self._auto_max_age:
+            self.max_age = 3 * interval + 5
+        if self._running:
+            for commands in self._commands:
+                commands.put((_OP_INTERVAL, interval))
+
+    def configure_device(self, ip, **settings):
+        """Apply CozyLifeDevice.configure() settings to a device in its worker."""
+        with self._lock:
+            entry = self._devices.get(ip)
+        if entry is not None and self._running:
+            self._commands[entry[0]].put((_OP_CONFIGURE, entry[1], settings))
+
+    def __len__(self):
+        """Return the number of devices handled by the engine."""
+        return len(self._devices)
+
+    def get_sample(self, ip):
+        """Return ``(state, timestamp)`` of the latest reading of a device.
+
+        ``state`` is in query_state() format, or None when the device has no
+        fresh reading; ``timestamp`` is the end of the shard round that
+        polled it, or the time of a later successful switch command.
+        """
+        with self._lock:
+            entry = self._devices.get(ip)
+            if entry is None:
+                return None, None
+            shard, device_id = entry
+            reading = self._readings.get(device_id)
+            seen = self._shard_seen[shard]
+            switched = self._switched.get(device_id)
+        timestamp = seen if switched is None else max(seen, switched[0])
+        if reading is None or time.time() - seen > self.max_age:
+            return None, timestamp
+        return {
+            key: value for key, value in zip(ENGINE_ATTRS, reading)
+            if value is not None
+        }, timestamp
+
+    def get_state(self, ip):
+        """Return the latest reading of a device in query_state() format."""
+        return self.get_sample(ip)[0]
+
+    def send_command(self, ip, state, timeout=5.0):
+        """Switch a device through its worker and wait for the result."""
+        with self._lock:
+            entry = self._devices.get(ip)
+            if entry is None or not self._running:
+                return False
+            request_id = next(self._request_ids)
+            reply = self._replies[request_id] = [threading.Event(), False]
+        self._commands[entry[0]].put((_OP_SET, entry[1], bool(state), request_id))
+        if not reply[0].wait(timeout):
+            with self._lock:
+                self._replies.pop(request_id, None)
+            return False
+        if reply[1]:
+            # The cached reading predates the command: update it now instead
+            # of reporting the old state until the next round
+            value = 255 if state else 0
+            with self._lock:
+                reading = self._readings.get(entry[1])
+                if reading is not None:
+                    self._readings[entry[1]] = (value,) + reading[1:]
+                    self._switched[entry[1]] = (time.time(), value)
+        return reply[1]
+
+    def device(self, ip):
+        """Return a CozyLifeDevice-compatible handle for a device."""
+        return EngineDevice(self, ip)
+
+
+class EngineDevice:
+    """Drop-in replacement for CozyLifeDevice backed by a ShardedPoller."""
+
+    def __init__(self, engine, ip):
+        """Initialize the handle."""
+        self.ip = ip
+        self._engine = engine
+
+    def configure(self, **kwargs):
+        """Forward timeouts and queried attributes to the device's worker."""
+        self._engine.configure_device(self.ip, **kwargs)
+
+    def test_connection(self):
+        """Return True when the engine has a fresh reading."""
+        return self.query_state() is not None
+
+    def query_state(self):
+        """Return the latest reading polled by the engine."""
+        return self._engine.get_state(self.ip)
+
+    def query_sample(self):
+        """Return the latest reading and the time it was polled."""
+        return self._engine.get_sample(self.ip)
+
+    def send_command(self, state):
+        """Send command to device through its worker."""
+        return self._engine.send_command(self.ip, state)
@@ -0,0 +1,266 @@
+"""Append-only binary export of raw CozyLife readings.
+
+Readings are written as fixed-width little-endian records into segment
+files. A JSON index next to the segments lists every segment with its
+time range and record count, plus the mapping of device IP to the device
+index stored in each record. Segments can be scanned without copying
+through ``np.memmap`` (see ``open_segment``).
+
+``append()`` only queues the reading: a writer thread owns the files and
+does every write, roll, flush and retention pass, so callers on the Home
+Assistant event loop never touch the disk. Writes are flushed and the
+index rewritten every ``flush_interval`` seconds. The segment being written is listed with ``"open": true``; its
+count and end time may lag behind the file, so readers size it from the
+file itself and ``open()`` recovers it from the file after a crash.
+"""
+import json
+import logging
+import os
+import queue
+import struct
+import threading
+import time
+
+import numpy as np
+
+_LOGGER = logging.getLogger(__name__)
+
+# timestamp, device index, attrs 1/27/28/29 (-1 when missing)
+RECORD_FORMAT = "<dIiiii"
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+RECORD_DTYPE = np.dtype([
+    ("timestamp", "<f8"),
+    ("device", "<u4"),
+    ("switch", "<i4"),
+    ("current", "<i4"),
+    ("power", "<i4"),
+    ("voltage", "<i4"),
+])
+EXPORT_ATTRS = ('1', '27', '28', '29')
+
+INDEX_FILE = "index.json"
+SEGMENT_SUFFIX = ".seg"
+
+_record = struct.Struct(RECORD_FORMAT)
+
+
+def _attr(data, key):
+    """Return an attribute as int, or -1 when missing or malformed."""
+    try:
+        return int(data[key])
+    except (KeyError, TypeError, ValueError):
+        return -1
+
+
+class ReadingExporter:
+    """Write every reading into size/time bounded segment files."""
+
+    def __init__(
+        self,
+        directory,
+        max_segment_bytes=16 * 1024 * 1024,
+        max_segment_age=3600,
+        max_total_bytes=512 * 1024 * 1024,
+        retention=7 * 24 * 3600,
+        flush_interval=10,
+    ):
+        """Initialize the exporter; call ``open()`` before appending."""
+        self.directory = directory
+        # Round down to whole records so segments never hold partial ones
+        self.max_segment_bytes = max(RECORD_SIZE, max_segment_bytes // RECORD_SIZE * RECORD_SIZE)
+        self.max_segment_age = max_segment_age
+        self.max_total_bytes = max_total_bytes
+        self.retention = retention
+        self.flush_interval = flush_interval
+        self._queue = queue.SimpleQueue()  # readings waiting for the writer, None stops it
+        self._writer = None
+        self._devices = {}  # ip -> device index
+        self._segments = []  # closed segments, oldest first
+        self._file = None
+        self._current = None
+        self._flushed = 0.0  # monotonic time of the last flush
+        self._dirty = False  # records written since the last flush
+
+    def open(self):
+        """Load the existing index and start the writer thread."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, INDEX_FILE)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            self._devices = dict(index.get("devices", {}))
+            self._segments = [
+                seg for seg in map(self._recover_segment, index.get("segments", []))
+                if seg is not None
+            ]
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError, TypeError) as e:
+            _LOGGER.warning(f"Ignoring unreadable export index {path}: {e}")
+        self._enforce_retention(time.time())
+        self._writer = threading.Thread(
+            target=self._run, name="cozylife-export-writer", daemon=True
+        )
+        self._writer.start()
+
+    def close(self):
+        """Write the queued readings, close the current segment and write the index."""
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+        self._close_segment()
+        self._write_index()
+
+    def append(self, ip, data, timestamp=None):
+        """Queue one query_state() result for a device; never blocks on I/O."""
+        timestamp = time.time() if timestamp is None else timestamp
+        self._queue.put((ip, data, timestamp))
+
+    def _run(self):
+        """Writer thread: drain the queue until close() is called."""
+        while True:
+            try:
+                item = self._queue.get(timeout=max(self.flush_interval, 0.1))
+            except queue.Empty:
+                # Idle: make the last readings visible to readers
+                item = False
+            if item is None:
+                return
+            try:
+                if item:
+                    self._write(*item)
+                if self._dirty and time.monotonic() - self._flushed >= self.flush_interval:
+                    self._flush()
+            except Exception as e:
+                _LOGGER.debug(f"Failed to export reading: {e}")
+
+    def _write(self, ip, data, timestamp):
+        device = self._devices.get(ip)
+        if device is None:
+            device = self._devices[ip] = len(self._devices)
+        if self._file is None or self._should_roll(timestamp):
+            self._roll(timestamp)
+        self._file.write(_record.pack(
+            timestamp, device, *(_attr(data, key) for key in EXPORT_ATTRS)
+        ))
+        self._current["count"] += 1
+        self._current["end"] = timestamp
+        self._dirty = True
+
+    def _flush(self):
+        self._file.flush()
+        self._enforce_retention(time.time())
+        self._write_index()
+
+    def _recover_segment(self, seg):
+        """Validate an index entry, rebuilding it from the file if left open.
+
+        Returns None when the segment file is missing or holds no records.
+        """
+        path = os.path.join(self.directory, seg["file"])
+        if not seg.get("open"):
+            return seg if os.path.exists(path) else None
+        # The process stopped while writing: the file is the source of truth
+        try:
+            count = os.path.getsize(path) // RECORD_SIZE
+        except FileNotFoundError:
+            return None
+        if count == 0:
+            os.remove(path)
+            return None
+        with open(path, "rb") as f:
+            f.seek((count - 1) * RECORD_SIZE)
+            end = _record.unpack(f.read(RECORD_SIZE))[0]
+        return {"file": seg["file"], "start": seg["start"], "end": end, "count": count}
+
+    def _should_roll(self, timestamp):
+        current = self._current
+        return (
+            current["count"] * RECORD_SIZE >= self.max_segment_bytes
+            or timestamp - current["start"] >= self.max_segment_age
+        )
+
+    def _roll(self, timestamp):
+        """Close the current segment and start a new one."""
+        self._close_segment()
+        name = f"{int(timestamp * 1000):013d}{SEGMENT_SUFFIX}"
+        # Appending to an existing file keeps earlier records of the same ms
+        self._file = open(os.path.join(self.directory, name), "ab")
+        self._current = {"file": name, "start": timestamp, "end": timestamp, "count": 0}
+        self._enforce_retention(timestamp)
+        self._write_index()
+
+    def _close_segment(self):
+        if self._file is None:
+            return
+        try:
+            self._file.close()
+        finally:
+            self._file = None
+            if self._current["count"] > 0:
+                self._segments.append(self._current)
+            self._current = None
+
+    def _enforce_retention(self, now):
+        """Drop the oldest closed segments beyond the age and size limits.
+
+        The segment being written counts towards the size limit but is
+        never removed.
+        """
+        total = sum(seg["count"] for seg in self._segments) * RECORD_SIZE
+        if self._current is not None:
+            total += self._current["count"] * RECORD_SIZE
+        while self._segments and (
+            total > self.max_total_bytes
+            or now - self._segments[0]["end"] > self.retention
+        ):
+            seg = self._segments.pop(0)
+            total -= seg["count"] * RECORD_SIZE
+            try:
+                os.remove(os.path.join(self.directory, seg["file"]))
+            except FileNotFoundError:
+                pass
+
+    def _write_index(self):
+        self._flushed = time.monotonic()
+        self._dirty = False
+        segments = list(self._segments)
+        if self._current is not None:
+            segments.append(dict(self._current, open=True))
+        path = os.path.join(self.directory, INDEX_FILE)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({
+                "record_format": RECORD_FORMAT,
+                "attrs": list(EXPORT_ATTRS),
+                "devices": self._devices,
+                "segments": segments,
+            }, f)
+        os.replace(tmp, path)
+
+
+def load_index(directory):
+    """Read the export index of a directory."""
+    with open(os.path.join(directory, INDEX_FILE), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def open_segment(directory, name):
+    """Memory-map a segment as a structured array of RECORD_DTYPE."""
+    path = os.path.join(directory, name)
+    count = os.path.getsize(path) // RECORD_SIZE
+    if count == 0:
+        return np.empty(0, dtype=RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode="r", shape=(count,))
+
+
+def iter_segments(directory, start=None, end=None):
+    """Yield memory-mapped segments overlapping the [start, end] time range."""
+    for seg in load_index(directory)["segments"]:
+        # The end time of the open segment may be stale: never skip it on that
+        if start is not None and not seg.get("open") and seg["end"] < start:
+            continue
+        if end is not None and seg["start"] > end:
+            continue
+        yield open_segment(directory, seg["file"])
@@ -0,0 +1,170 @@
+"""Columnar state store shared by every CozyLife device."""
+import logging
+import threading
+import time
+
+import numpy as np
+
+_LOGGER = logging.getLogger(__name__)
+
+_INITIAL_CAPACITY = 16
+
+
+class FleetStore:
+    """Keep the latest reading of every device in parallel arrays.
+
+    Each registered device owns one slot; the entities write their poll
+    results into it and fleet-level aggregates are computed from the
+    arrays in a single vectorized pass.
+    """
+
+    def __init__(self, capacity=_INITIAL_CAPACITY):
+        """Initialize an empty store."""
+        self._lock = threading.Lock()
+        self._slots = {}  # ip -> slot index
+        self._free = list(range(capacity - 1, -1, -1))
+        self._ips = [None] * capacity
+        self._names = [None] * capacity
+        self._registered = np.zeros(capacity, dtype=bool)
+        self._available = np.zeros(capacity, dtype=bool)
+        self._on = np.zeros(capacity, dtype=bool)
+        self._power = np.zeros(capacity, dtype=np.float64)
+        self._current = np.zeros(capacity, dtype=np.float64)
+        self._voltage = np.zeros(capacity, dtype=np.float64)
+        self._timestamp = np.zeros(capacity, dtype=np.float64)
+        # Optional ReadingExporter receiving every recorded reading
+        self.exporter = None
+
+    def __len__(self):
+        """Return the number of registered devices."""
+        return len(self._slots)
+
+    def _grow(self):
+        """Double the capacity of every column."""
+        capacity = len(self._ips)
+        self._ips.extend([None] * capacity)
+        self._names.extend([None] * capacity)
+        for attr in ("_registered", "_available", "_on", "_power",
+                     "_current", "_voltage", "_timestamp"):
+            column = getattr(self, attr)
+            setattr(self, attr, np.concatenate((column, np.zeros_like(column))))
+        self._free.extend(range(2 * capacity - 1, capacity - 1, -1))
+
+    def register(self, ip, name=None):
+        """Reserve a slot for a device and return its index."""
+        with self._lock:
+            if ip in self._slots:
+                slot = self._slots[ip]
+                self._names[slot] = name or ip
+                return slot
+            if not self._free:
+                self._grow()
+            slot = self._free.pop()
+            self._slots[ip] = slot
+            self._ips[slot] = ip
+            self._names[slot] = name or ip
+            self._registered[slot] = True
+            self._available[slot] = False
+            self._on[slot] = False
+            self._power[slot] = np.nan
+            self._current[slot] = np.nan
+            self._voltage[slot] = np.nan
+            self._timestamp[slot] = 0.0
+            return slot
+
+    def unregister(self, ip):
+        """Release the slot of a device."""
+        with self._lock:
+            slot = self._slots.pop(ip, None)
+            if slot is None:
+                return
+            self._ips[slot] = None
+            self._names[slot] = None
+            self._registered[slot] = False
+            self._available[slot] = False
+            self._free.append(slot)
+
+    def record(self, ip, data, timestamp=None):
+        """Store a query_state() result for a device."""
+        if timestamp is None:
+            timestamp = time.time()
+        with self._lock:
+            slot = self._slots.get(ip)
+            # Readings shared by several entities (engine mode) are stored once
+            if slot is None or timestamp <= self._timestamp[slot]:
+                return
+            if '1' in data:
+                self._on[slot] = data['1'] > 0
+            # Attributes that were not queried are stored as NaN so an old
+            # value is never reported as a fresh one
+            self._current[slot] = float(data['27']) / 1000.0 if '27' in data else np.nan
+            self._power[slot] = float(data['28']) if '28' in data else np.nan
+            self._voltage[slot] = float(data['29']) if '29' in data else np.nan
+            self._timestamp[slot] = timestamp
+            self._available[slot] = True
+
+        exporter = self.exporter
+        if exporter is not None:
+            # Export failures must never affect the device entities
+            try:
+                exporter.append(ip, data, timestamp)
+            except Exception as e:
+                _LOGGER.debug(f"Failed to export reading from {ip}: {e}")
+
+    def mark_unavailable(self, ip):
+        """Flag a device as unavailable."""
+        with self._lock:
+            slot = self._slots.get(ip)
+            if slot is not None:
+                self._available[slot] = False
+
+    def aggregate(self, top_n=5, max_age=None, now=None):
+        """Compute fleet-level numbers from the current columns.
+
+        Readings older than ``max_age`` seconds are treated as unavailable.
+        """
+        with self._lock:
+            registered = self._registered
+            available = registered & self._available
+            if max_age is not None:
+                now = time.time() if now is None else now
+                available &= (now - self._timestamp) <= max_age
+
+            with_power = available & ~np.isnan(self._power)
+            with_current = available & ~np.isnan(self._current)
+            with_voltage = available & (self._voltage > 0)
+            on = available & self._on
+            count_available = int(np.count_nonzero(available))
+            count_power = int(np.count_nonzero(with_power))
+
+            top = []
+            k = min(top_n, count_power)
+            if k > 0:
+                rank = np.where(with_power, -self._power, np.inf)
+                candidates = np.argpartition(rank, k - 1)[:k]
+                for slot in candidates[np.argsort(rank[candidates], kind="stable")]:
+                    top.append({
+                        "name": self._names[slot],
+                        "ip": self._ips[slot],
+                        "power": float(self._power[slot]),
+                    })
+
+            # Totals are None when no available device reports the attribute
+            return {
+                "count_devices": len(self._slots),
+                "count_available": count_available,
+                "count_unavailable": int(np.count_nonzero(registered)) - count_available,
+                "count_on": int(np.count_nonzero(on)),
+                "total_power": (
+                    float(self._power[with_power].sum()) if count_power else None
+                ),
+                "total_current": (
+                    float(self._current[with_current].sum())
+                    if with_current.any() else None
+                ),
+                "mean_voltage": (
+                    float(self._voltage[with_voltage].mean())
+                    if with_voltage.any() else None
+                ),
+                "top_consumers": top,
+            }
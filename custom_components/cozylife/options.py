@@ -0,0 +1,144 @@
+"""Tùy chọn khi chạy cho các mục Cozy Life.
+
+Giá trị hiệu lực của một thiết bị được ghép theo thứ tự:
+mặc định trong const.py -> tùy chọn của mục hub -> tùy chọn riêng của thiết bị.
+"""
+from datetime import timedelta
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_SCAN_INTERVAL
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.helpers.event import async_track_time_interval
+
+from .const import (
+    DOMAIN,
+    CONF_DEVICE_TYPE,
+    DEVICE_TYPE_HUB,
+    DATA_HUB,
+    SIGNAL_OPTIONS_UPDATED,
+    DEFAULT_DEVICE_OPTIONS,
+    DEFAULT_HUB_OPTIONS,
+    CONF_CONNECT_TIMEOUT,
+    CONF_READ_TIMEOUT,
+    CONF_CONNECT_RETRY_DELAY,
+    CONF_ENABLE_SENSOR_POWER,
+    CONF_ENABLE_SENSOR_VOLTAGE,
+    CONF_ENABLE_SENSOR_CURRENT,
+    CONF_ENABLE_SENSOR_ENERGY,
+    ATTR_SWITCH,
+    ATTR_CURRENT,
+    ATTR_POWER,
+    ATTR_VOLTAGE,
+    QUERY_ATTRS,
+)
+
+
+@callback
+def get_hub_entry(hass: HomeAssistant):
+    """Trả về mục hub nếu đã được tạo."""
+    for entry in hass.config_entries.async_entries(DOMAIN):
+        if entry.data.get(CONF_DEVICE_TYPE) == DEVICE_TYPE_HUB:
+            return entry
+    return None
+
+
+@callback
+def get_inherited_options(hass: HomeAssistant):
+    """Tùy chọn thiết bị mặc định cho cả hệ thống (đã áp dụng mục hub)."""
+    options = dict(DEFAULT_DEVICE_OPTIONS)
+    hub = get_hub_entry(hass)
+    if hub is not None:
+        options.update(
+            (key, value) for key, value in hub.options.items()
+            if key in DEFAULT_DEVICE_OPTIONS
+        )
+    return options
+
+
+@callback
+def get_device_options(hass: HomeAssistant, entry: ConfigEntry):
+    """Tùy chọn hiệu lực của một thiết bị."""
+    options = get_inherited_options(hass)
+    options.update(entry.options)
+    return options
+
+
+@callback
+def get_hub_options(hass: HomeAssistant, entry: ConfigEntry):
+    """Tùy chọn hiệu lực của mục hub."""
+    options = dict(DEFAULT_HUB_OPTIONS)
+    options.update(
+        (key, value) for key, value in entry.options.items()
+        if key in DEFAULT_HUB_OPTIONS
+    )
+    return options
+
+
+@callback
+def get_query_attrs(hass: HomeAssistant, options):
+    """Danh sách thuộc tính cần hỏi, bỏ các thuộc tính của cảm biến đang tắt.
+
+    Khi mục hub đang chạy, mọi thuộc tính đều được hỏi để các cảm biến
+    tổng hợp luôn có số liệu mới.
+    """
+    if DATA_HUB in hass.data.get(DOMAIN, {}):
+        return list(QUERY_ATTRS)
+    attrs = [ATTR_SWITCH]
+    if options[CONF_ENABLE_SENSOR_CURRENT]:
+        attrs.append(ATTR_CURRENT)
+    if options[CONF_ENABLE_SENSOR_POWER] or options[CONF_ENABLE_SENSOR_ENERGY]:
+        attrs.append(ATTR_POWER)
+    if options[CONF_ENABLE_SENSOR_VOLTAGE]:
+        attrs.append(ATTR_VOLTAGE)
+    return attrs
+
+
+@callback
+def apply_device_options(hass: HomeAssistant, device, options):
+    """Áp dụng thời gian chờ và danh sách thuộc tính lên đối tượng thiết bị."""
+    device.configure(
+        connect_timeout=options[CONF_CONNECT_TIMEOUT],
+        read_timeout=options[CONF_READ_TIMEOUT],
+        connect_retry_delay=options[CONF_CONNECT_RETRY_DELAY],
+        query_attrs=get_query_attrs(hass, options),
+    )
+
+
+@callback
+def async_track_refresh(
+    hass: HomeAssistant,
+    entry: ConfigEntry,
+    action,
+    get_options,
+    interval_key=CONF_SCAN_INTERVAL,
+):
+    """Gọi action định kỳ và áp dụng lại chu kỳ mỗi khi tùy chọn thay đổi.
+
+    get_options() trả về tùy chọn hiệu lực mới nhất; chu kỳ (giây) lấy
+    theo khóa interval_key.
+    """
+    unsub = None
+    interval = None
+
+    @callback
+    def reschedule():
+        nonlocal unsub, interval
+        seconds = get_options()[interval_key]
+        if unsub is not None and seconds == interval:
+            return
+        if unsub is not None:
+            unsub()
+        interval = seconds
+        unsub = async_track_time_interval(hass, action, timedelta(seconds=seconds))
+
+    @callback
+    def cancel():
+        if unsub is not None:
+            unsub()
+
+    reschedule()
+    entry.async_on_unload(cancel)
+    entry.async_on_unload(
+        async_dispatcher_connect(hass, SIGNAL_OPTIONS_UPDATED, reschedule)
+    )
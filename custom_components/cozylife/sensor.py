@@ -2,45 +2,85 @@
 
 # ============================
 # Các hằng số cấu hình
+# (chu kỳ, thời gian chờ và cờ bật/tắt cảm biến nằm trong options flow,
+# giá trị mặc định ở const.py)
 from datetime import timedelta
 
-DEFAULT_TIMEOUT = 5  # giây
-SCAN_INTERVAL = timedelta(seconds=5)
+# Cảm biến điện năng (kWh) tích lũy cục bộ
+ENERGY_PUBLISH_INTERVAL = timedelta(seconds=60)  # chu kỳ ghi trạng thái lên HA
+ENERGY_MAX_GAP = 30  # giây; khoảng trống lớn hơn sẽ không được tích phân
+ENERGY_MAX_GAP_INTERVALS = 3  # luôn cho phép ít nhất 3 chu kỳ thăm dò
 
-# Các cờ bật/tắt các loại cảm biến
-ENABLE_SENSOR_POWER = True
-ENABLE_SENSOR_VOLTAGE = False
-ENABLE_SENSOR_CURRENT = False
+# Cảm biến tổng hợp: số liệu chỉ bị coi là cũ sau ít nhất 3 chu kỳ thăm dò
+FLEET_MAX_AGE_INTERVALS = 3
 
 # Cờ debug
 ENABLE_LOGGING = False
 # ============================
 
 from homeassistant.components.sensor import (
+    RestoreSensor,
     SensorEntity,
     SensorDeviceClass,
     SensorStateClass,
 )
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.const import (
     CONF_NAME,
     CONF_IP_ADDRESS,
+    CONF_TIMEOUT,
+    CONF_SCAN_INTERVAL,
     UnitOfPower,
+    UnitOfEnergy,
     UnitOfElectricCurrent,
     UnitOfElectricPotential,
 )
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
 from homeassistant.helpers.entity import DeviceInfo
 from homeassistant.helpers.event import async_track_time_interval
 import asyncio
 import async_timeout
-from .const import DOMAIN, DEVICE_TYPE_SWITCH, CONF_DEVICE_TYPE
-from .cozylife_device import CozyLifeDevice
+import time
+from .const import (
+    DOMAIN,
+    DEVICE_TYPE_SWITCH,
+    DEVICE_TYPE_HUB,
+    CONF_DEVICE_TYPE,
+    CONF_MAX_ERRORS,
+    DEFAULT_MAX_ERRORS,
+    CONF_ENABLE_SENSOR_POWER,
+    CONF_ENABLE_SENSOR_VOLTAGE,
+    CONF_ENABLE_SENSOR_CURRENT,
+    CONF_ENABLE_SENSOR_ENERGY,
+    CONF_FLEET_INTERVAL,
+    CONF_FLEET_TOP_N,
+    CONF_FLEET_MAX_AGE,
+    DATA_FLEET,
+    SIGNAL_OPTIONS_UPDATED,
+)
+from . import get_device
+from .options import (
+    apply_device_options,
+    async_track_refresh,
+    get_device_options,
+    get_hub_options,
+    get_inherited_options,
+)
+from .energy import EnergyAccumulator
 import logging
 
 _LOGGER = logging.getLogger(__name__)
 
+# Cờ bật/tắt cảm biến; đổi một trong các cờ này sẽ nạp lại mục cấu hình
+SENSOR_OPTION_KEYS = (
+    CONF_ENABLE_SENSOR_CURRENT,
+    CONF_ENABLE_SENSOR_POWER,
+    CONF_ENABLE_SENSOR_VOLTAGE,
+    CONF_ENABLE_SENSOR_ENERGY,
+)
+
 
 async def async_setup_entry(
     hass: HomeAssistant,
@@ -49,26 +89,90 @@ async def async_setup_entry(
 ) -> None:
     """Thiết lập cảm biến Ổ Cắm Cozy Life."""
     config = config_entry.data
+    fleet = hass.data[DOMAIN][DATA_FLEET]
+
+    if config[CONF_DEVICE_TYPE] == DEVICE_TYPE_HUB:
+        fleet_sensors = [
+            CozyLifeFleetPowerSensor(),
+            CozyLifeFleetCurrentSensor(),
+            CozyLifeFleetVoltageSensor(),
+            CozyLifeFleetOnSensor(),
+            CozyLifeFleetUnavailableSensor(),
+            CozyLifeFleetTopConsumerSensor(),
+        ]
+        async_add_entities(fleet_sensors)
+
+        def hub_options():
+            return get_hub_options(hass, config_entry)
+
+        def slowest_scan_interval():
+            """Chu kỳ thăm dò dài nhất trong các thiết bị đang có."""
+            intervals = [
+                get_device_options(hass, entry)[CONF_SCAN_INTERVAL]
+                for entry in hass.config_entries.async_entries(DOMAIN)
+                if entry.data.get(CONF_DEVICE_TYPE) == DEVICE_TYPE_SWITCH
+            ]
+            return max(intervals, default=get_inherited_options(hass)[CONF_SCAN_INTERVAL])
+
+        @callback
+        def refresh_fleet(now=None):
+            """Tính các số liệu tổng hợp một lần rồi phân phát cho các cảm biến."""
+            options = hub_options()
+            summary = fleet.aggregate(
+                top_n=options[CONF_FLEET_TOP_N],
+                max_age=max(
+                    options[CONF_FLEET_MAX_AGE],
+                    FLEET_MAX_AGE_INTERVALS * slowest_scan_interval(),
+                ),
+            )
+            for sensor in fleet_sensors:
+                sensor.set_summary(summary)
+
+        refresh_fleet()
+        async_track_refresh(
+            hass, config_entry, refresh_fleet, hub_options, interval_key=CONF_FLEET_INTERVAL
+        )
+
+    elif config[CONF_DEVICE_TYPE] == DEVICE_TYPE_SWITCH:
+
+        def current_options():
+            return get_device_options(hass, config_entry)
 
-    if config[CONF_DEVICE_TYPE] == DEVICE_TYPE_SWITCH:
-        device = CozyLifeDevice(config[CONF_IP_ADDRESS])
+        def enabled_sensors(options):
+            return tuple(options[key] for key in SENSOR_OPTION_KEYS)
+
+        options = current_options()
+        enabled = enabled_sensors(options)
+        device = get_device(hass, config[CONF_IP_ADDRESS])
+        apply_device_options(hass, device, options)
         sensors = []
 
-        if ENABLE_SENSOR_CURRENT:
-            sensors.append(CozyLifeCurrentSensor(config, config_entry.entry_id, device))
-        if ENABLE_SENSOR_POWER:
-            sensors.append(CozyLifePowerSensor(config, config_entry.entry_id, device))
-        if ENABLE_SENSOR_VOLTAGE:
-            sensors.append(CozyLifeVoltageSensor(config, config_entry.entry_id, device))
+        if options[CONF_ENABLE_SENSOR_CURRENT]:
+            sensors.append(CozyLifeCurrentSensor(config, config_entry.entry_id, device, fleet))
+        if options[CONF_ENABLE_SENSOR_POWER]:
+            sensors.append(CozyLifePowerSensor(config, config_entry.entry_id, device, fleet))
+        if options[CONF_ENABLE_SENSOR_VOLTAGE]:
+            sensors.append(CozyLifeVoltageSensor(config, config_entry.entry_id, device, fleet))
+        if options[CONF_ENABLE_SENSOR_ENERGY]:
+            sensors.append(CozyLifeEnergySensor(config, config_entry.entry_id, device, fleet))
 
+        for sensor in sensors:
+            sensor.apply_options(options)
         async_add_entities(sensors)
 
+        if not sensors:
+            return
+
+        last_sample = None
+
         async def refresh_state(now=None):
-            """Làm mới trạng thái cảm biến."""
+            """Truy vấn thiết bị một lần rồi chia kết quả cho mọi cảm biến."""
+            nonlocal last_sample
+            state = None
+            timestamp = time.time()
             try:
-                async with async_timeout.timeout(DEFAULT_TIMEOUT):
-                    for sensor in sensors:
-                        await hass.async_add_executor_job(sensor.update)
+                async with async_timeout.timeout(current_options()[CONF_TIMEOUT]):
+                    state, timestamp = await hass.async_add_executor_job(device.query_sample)
             except asyncio.TimeoutError:
                 if ENABLE_LOGGING:
                     _LOGGER.warning("Timeout while updating sensors")
@@ -76,14 +180,44 @@ async def async_setup_entry(
                 if ENABLE_LOGGING:
                     _LOGGER.error(f"Error updating sensors: {e}")
 
+            if state is not None:
+                # Mẫu chưa đổi (bộ thăm dò chưa chạy vòng mới): bỏ qua
+                if timestamp == last_sample:
+                    return
+                last_sample = timestamp
+                fleet.record(config[CONF_IP_ADDRESS], state, timestamp)
+            for sensor in sensors:
+                sensor.handle_state(state, timestamp)
+                if sensor.hass is not None and sensor._publish_on_update:
+                    sensor.async_write_ha_state()
+
+        @callback
+        def apply_options():
+            """Áp dụng tùy chọn mới; chỉ nạp lại mục khi danh sách cảm biến đổi."""
+            options = current_options()
+            if enabled_sensors(options) != enabled:
+                hass.config_entries.async_schedule_reload(config_entry.entry_id)
+                return
+            apply_device_options(hass, device, options)
+            for sensor in sensors:
+                sensor.apply_options(options)
+
         await refresh_state()
-        async_track_time_interval(hass, refresh_state, SCAN_INTERVAL)
+        async_track_refresh(hass, config_entry, refresh_state, current_options)
+        config_entry.async_on_unload(
+            async_dispatcher_connect(hass, SIGNAL_OPTIONS_UPDATED, apply_options)
+        )
 
 
 # Base Sensor Class (common logic)
 class CozyLifeBaseSensor(SensorEntity):
-    def __init__(self, config, device, key, name_suffix, unit, device_class):
+    # Trạng thái do bộ hẹn giờ của nền tảng làm mới, HA không tự thăm dò
+    _attr_should_poll = False
+    _publish_on_update = True
+
+    def __init__(self, config, device, fleet, key, name_suffix, unit, device_class):
         self._device = device
+        self._fleet = fleet
         self._ip = config[CONF_IP_ADDRESS]
         self._entry_id = config.get("entry_id")
         base_name = config.get(CONF_NAME, f"cozylife_ {self._ip}")
@@ -104,31 +238,18 @@ class CozyLifeBaseSensor(SensorEntity):
         self._state = None
         self._available = True
         self._error_count = 0
-        self._max_errors = 3
+        self._max_errors = DEFAULT_MAX_ERRORS
         self._last_valid_state = None
 
-        self._initialize_state()
-
-    def _initialize_state(self):
-        try:
-            state = self._device.query_state()
-            if state is not None:
-                raw = state.get(self._key, 0)
-                self._state = self._convert(raw)
-                self._last_valid_state = self._state
-                self._available = True
-                self._error_count = 0
-                if ENABLE_LOGGING:
-                    _LOGGER.info(f"Initialized sensor {self.name}: {self._state}")
-            else:
-                self._handle_error("Failed to initialize sensor state")
-        except Exception as e:
-            self._handle_error(f"Exception during initialization: {e}")
+    def apply_options(self, options):
+        """Áp dụng tùy chọn hiệu lực của thiết bị."""
+        self._max_errors = options[CONF_MAX_ERRORS]
 
     def _handle_error(self, error_message):
         self._error_count += 1
         if self._error_count >= self._max_errors:
             self._available = False
+            self._fleet.mark_unavailable(self._ip)
             if ENABLE_LOGGING:
                 _LOGGER.error(f"{error_message} - Marking sensor unavailable")
         else:
@@ -143,17 +264,17 @@ class CozyLifeBaseSensor(SensorEntity):
     def native_value(self):
         return self._state
 
-    def update(self):
+    def handle_state(self, state, timestamp):
+        """Nhận kết quả truy vấn chung của thiết bị (None khi thất bại)."""
+        if state is None:
+            self._handle_error("Failed to update sensor state")
+            return
         try:
-            state = self._device.query_state()
-            if state is not None:
-                raw = state.get(self._key, 0)
-                self._state = self._convert(raw)
-                self._last_valid_state = self._state
-                self._available = True
-                self._error_count = 0
-            else:
-                self._handle_error("Failed to update sensor state")
+            raw = state.get(self._key, 0)
+            self._state = self._convert(raw)
+            self._last_valid_state = self._state
+            self._available = True
+            self._error_count = 0
         except Exception as e:
             self._handle_error(f"Exception during update: {e}")
 
@@ -162,10 +283,11 @@ class CozyLifeBaseSensor(SensorEntity):
 
 
 class CozyLifePowerSensor(CozyLifeBaseSensor):
-    def __init__(self, config, entry_id, device):
+    def __init__(self, config, entry_id, device, fleet):
         super().__init__(
             config=config,
             device=device,
+            fleet=fleet,
             key='28',
             name_suffix="Power",
             unit=UnitOfPower.WATT,
@@ -174,10 +296,11 @@ class CozyLifePowerSensor(CozyLifeBaseSensor):
 
 
 class CozyLifeCurrentSensor(CozyLifeBaseSensor):
-    def __init__(self, config, entry_id, device):
+    def __init__(self, config, entry_id, device, fleet):
         super().__init__(
             config=config,
             device=device,
+            fleet=fleet,
             key='27',
             name_suffix="Current",
             unit=UnitOfElectricCurrent.AMPERE,
@@ -189,12 +312,178 @@ class CozyLifeCurrentSensor(CozyLifeBaseSensor):
 
 
 class CozyLifeVoltageSensor(CozyLifeBaseSensor):
-    def __init__(self, config, entry_id, device):
+    def __init__(self, config, entry_id, device, fleet):
         super().__init__(
             config=config,
             device=device,
+            fleet=fleet,
             key='29',
             name_suffix="Voltage",
             unit=UnitOfElectricPotential.VOLT,
             device_class=SensorDeviceClass.VOLTAGE,
-        )
\ No newline at end of file
+        )
+
+
+class CozyLifeEnergySensor(CozyLifeBaseSensor, RestoreSensor):
+    """Điện năng tích lũy từ công suất tức thời ('28') theo quy tắc hình thang."""
+
+    # Lấy mẫu theo chu kỳ thăm dò nhưng chỉ ghi trạng thái theo ENERGY_PUBLISH_INTERVAL
+    _publish_on_update = False
+
+    def __init__(self, config, entry_id, device, fleet):
+        self._accumulator = EnergyAccumulator(max_gap=ENERGY_MAX_GAP)
+        super().__init__(
+            config=config,
+            device=device,
+            fleet=fleet,
+            key='28',
+            name_suffix="Energy",
+            unit=UnitOfEnergy.KILO_WATT_HOUR,
+            device_class=SensorDeviceClass.ENERGY,
+        )
+        self._attr_state_class = SensorStateClass.TOTAL_INCREASING
+
+    async def async_added_to_hass(self):
+        await super().async_added_to_hass()
+        # Khôi phục tổng đã lưu (HA lưu định kỳ và khi tắt máy)
+        last = await self.async_get_last_sensor_data()
+        if last is not None and last.native_value is not None:
+            try:
+                self._accumulator.total += float(last.native_value)
+            except (TypeError, ValueError):
+                pass
+        self.async_on_remove(
+            async_track_time_interval(self.hass, self._async_publish, ENERGY_PUBLISH_INTERVAL)
+        )
+        self.async_write_ha_state()
+
+    @callback
+    def _async_publish(self, now=None):
+        self.async_write_ha_state()
+
+    @property
+    def native_value(self):
+        return round(self._accumulator.total, 3)
+
+    def apply_options(self, options):
+        super().apply_options(options)
+        # Khoảng trống cho phép phải theo kịp chu kỳ thăm dò, nếu không mọi mẫu bị bỏ
+        self._accumulator.max_gap = max(
+            ENERGY_MAX_GAP, ENERGY_MAX_GAP_INTERVALS * options[CONF_SCAN_INTERVAL]
+        )
+
+    def _handle_error(self, error_message):
+        super()._handle_error(error_message)
+        if not self._available:
+            self._accumulator.break_series()
+
+    def handle_state(self, state, timestamp):
+        if state is None:
+            self._handle_error("Failed to update energy sample")
+            return
+        try:
+            self._accumulator.add(state.get(self._key, 0), timestamp)
+            self._available = True
+            self._error_count = 0
+        except Exception as e:
+            self._handle_error(f"Exception during energy update: {e}")
+
+
+# Cảm biến tổng hợp toàn bộ ổ cắm (thuộc mục hub)
+class CozyLifeFleetSensor(SensorEntity):
+    _attr_should_poll = False
+
+    def __init__(self, key, name_suffix, unit, device_class):
+        self._attr_name = name_suffix
+        self._attr_unique_id = f"cozylife_fleet_{key}"
+        self._attr_device_info = DeviceInfo(
+            identifiers={(DOMAIN, DEVICE_TYPE_HUB)},
+            name="CozyLife Fleet",
+            manufacturer="CozyLife",
+            model="Fleet",
+            sw_version="1.0",
+        )
+        self._attr_has_entity_name = True
+        self._attr_native_unit_of_measurement = unit
+        self._attr_device_class = device_class
+        self._attr_state_class = SensorStateClass.MEASUREMENT
+        self._key = key
+        self._attr_native_value = None
+
+    @callback
+    def set_summary(self, summary):
+        self._attr_native_value = summary[self._key]
+        # Không thiết bị nào cung cấp thuộc tính này
+        self._attr_available = self._attr_native_value is not None
+        if self.hass is not None:
+            self.async_write_ha_state()
+
+
+class CozyLifeFleetPowerSensor(CozyLifeFleetSensor):
+    def __init__(self):
+        super().__init__(
+            key="total_power",
+            name_suffix="Total Power",
+            unit=UnitOfPower.WATT,
+            device_class=SensorDeviceClass.POWER,
+        )
+
+
+class CozyLifeFleetCurrentSensor(CozyLifeFleetSensor):
+    def __init__(self):
+        super().__init__(
+            key="total_current",
+            name_suffix="Total Current",
+            unit=UnitOfElectricCurrent.AMPERE,
+            device_class=SensorDeviceClass.CURRENT,
+        )
+
+
+class CozyLifeFleetVoltageSensor(CozyLifeFleetSensor):
+    def __init__(self):
+        super().__init__(
+            key="mean_voltage",
+            name_suffix="Mean Voltage",
+            unit=UnitOfElectricPotential.VOLT,
+            device_class=SensorDeviceClass.VOLTAGE,
+        )
+
+
+class CozyLifeFleetOnSensor(CozyLifeFleetSensor):
+    def __init__(self):
+        super().__init__(
+            key="count_on",
+            name_suffix="Devices On",
+            unit=None,
+            device_class=None,
+        )
+
+
+class CozyLifeFleetUnavailableSensor(CozyLifeFleetSensor):
+    def __init__(self):
+        super().__init__(
+            key="count_unavailable",
+            name_suffix="Devices Unavailable",
+            unit=None,
+            device_class=None,
+        )
+
+
+class CozyLifeFleetTopConsumerSensor(CozyLifeFleetSensor):
+    def __init__(self):
+        super().__init__(
+            key="top_consumers",
+            name_suffix="Top Consumer",
+            unit=UnitOfPower.WATT,
+            device_class=SensorDeviceClass.POWER,
+        )
+        self._attr_extra_state_attributes = {"consumers": []}
+
+    @callback
+    def set_summary(self, summary):
+        top = summary[self._key]
+        self._attr_native_value = top[0]["power"] if top else None
+        self._attr_available = bool(top)
+        self._attr_extra_state_attributes = {"consumers": top}
+        if self.hass is not None:
+            self.async_write_ha_state()
@@ -2,24 +2,29 @@
 import asyncio
 import async_timeout
 import logging
-from datetime import timedelta
 
 from homeassistant.components.switch import SwitchEntity
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import CONF_NAME, CONF_IP_ADDRESS
-from homeassistant.core import HomeAssistant
+from homeassistant.const import CONF_NAME, CONF_IP_ADDRESS, CONF_TIMEOUT
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
 from homeassistant.helpers.entity import DeviceInfo
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
-from homeassistant.helpers.event import async_track_time_interval
 
-from .const import DOMAIN, DEVICE_TYPE_SWITCH, CONF_DEVICE_TYPE
-from .cozylife_device import CozyLifeDevice
+from .const import (
+    DOMAIN,
+    DEVICE_TYPE_SWITCH,
+    CONF_DEVICE_TYPE,
+    CONF_MAX_ERRORS,
+    DEFAULT_MAX_ERRORS,
+    DATA_FLEET,
+    SIGNAL_OPTIONS_UPDATED,
+)
+from . import get_device
+from .options import apply_device_options, async_track_refresh, get_device_options
 
 _LOGGER = logging.getLogger(__name__)
 
-SCAN_INTERVAL = timedelta(seconds=5)
-TIMEOUT = 5
-MAX_ERRORS = 3
 ENABLE_LOGGING = False  # Có thể bật/tắt log toàn cục tại đây
 
 
@@ -34,14 +39,24 @@ async def async_setup_entry(
     if config.get(CONF_DEVICE_TYPE) != DEVICE_TYPE_SWITCH:
         return
 
-    switch_entity = CozyLifeSwitch(config, config_entry.entry_id)
+    def current_options():
+        return get_device_options(hass, config_entry)
+
+    options = current_options()
+    fleet = hass.data[DOMAIN][DATA_FLEET]
+    device = get_device(hass, config[CONF_IP_ADDRESS])
+    apply_device_options(hass, device, options)
+    switch_entity = CozyLifeSwitch(config, config_entry.entry_id, device, fleet)
+    switch_entity.apply_options(options)
     async_add_entities([switch_entity])
 
     async def refresh_state(now=None):
         """Refresh device state periodically."""
         try:
-            async with async_timeout.timeout(TIMEOUT):
+            async with async_timeout.timeout(current_options()[CONF_TIMEOUT]):
                 await hass.async_add_executor_job(switch_entity.update)
+            if switch_entity.hass is not None:
+                switch_entity.async_write_ha_state()
         except asyncio.TimeoutError:
             if ENABLE_LOGGING:
                 _LOGGER.warning("Timeout while refreshing CozyLife switch state")
@@ -49,22 +64,37 @@ async def async_setup_entry(
             if ENABLE_LOGGING:
                 _LOGGER.error(f"Exception during switch refresh: {e}")
 
+    @callback
+    def apply_options():
+        """Apply changed options without reloading the entry."""
+        options = current_options()
+        apply_device_options(hass, device, options)
+        switch_entity.apply_options(options)
+
     await refresh_state()
-    async_track_time_interval(hass, refresh_state, SCAN_INTERVAL)
+    async_track_refresh(hass, config_entry, refresh_state, current_options)
+    config_entry.async_on_unload(
+        async_dispatcher_connect(hass, SIGNAL_OPTIONS_UPDATED, apply_options)
+    )
 
 
 class CozyLifeSwitch(SwitchEntity):
     """Representation of a CozyLife Switch."""
 
-    def __init__(self, config, entry_id):
+    # State is refreshed by the platform timer, not by HA polling
+    _attr_should_poll = False
+
+    def __init__(self, config, entry_id, device, fleet):
         """Initialize the switch."""
-        self._device = CozyLifeDevice(config[CONF_IP_ADDRESS])
+        self._device = device
+        self._fleet = fleet
         self._ip = config[CONF_IP_ADDRESS]
         self._name = config.get(CONF_NAME, f"CozyLife Switch {self._ip}")
         self._entry_id = entry_id
         self._is_on = False
         self._available = True
         self._error_count = 0
+        self._max_errors = DEFAULT_MAX_ERRORS
 
         self._attr_has_entity_name = True
         self._attr_name = self._name
@@ -75,11 +105,12 @@ class CozyLifeSwitch(SwitchEntity):
     def _initialize_state(self):
         """Initial read from the device."""
         try:
-            state = self._device.query_state()
+            state, timestamp = self._device.query_sample()
             if state is not None:
                 self._is_on = state.get('1', 0) > 0
                 self._available = True
                 self._error_count = 0
+                self._fleet.record(self._ip, state, timestamp)
                 if ENABLE_LOGGING:
                     _LOGGER.debug(f"[{self._name}] Initial state: {self._is_on}")
             else:
@@ -130,6 +161,7 @@ class CozyLifeSwitch(SwitchEntity):
                 self._error_count = 0
                 if ENABLE_LOGGING:
                     _LOGGER.debug(f"[{self._name}] Turned ON")
+                self.schedule_update_ha_state()
             else:
                 self._handle_error("Failed to turn on")
         except Exception as e:
@@ -143,19 +175,25 @@ class CozyLifeSwitch(SwitchEntity):
                 self._error_count = 0
                 if ENABLE_LOGGING:
                     _LOGGER.debug(f"[{self._name}] Turned OFF")
+                self.schedule_update_ha_state()
             else:
                 self._handle_error("Failed to turn off")
         except Exception as e:
             self._handle_error(f"Exception on turn off: {e}")
 
+    def apply_options(self, options):
+        """Apply the effective device options."""
+        self._max_errors = options[CONF_MAX_ERRORS]
+
     def update(self):
         """Fetch new state from the device."""
         try:
-            state = self._device.query_state()
+            state, timestamp = self._device.query_sample()
             if state is not None:
                 self._is_on = state.get('1', 0) > 0
                 self._available = True
                 self._error_count = 0
+                self._fleet.record(self._ip, state, timestamp)
                 if ENABLE_LOGGING:
                     _LOGGER.debug(f"[{self._name}] Updated state: {self._is_on}")
             else:
@@ -166,10 +204,11 @@ class CozyLifeSwitch(SwitchEntity):
     def _handle_error(self, message):
         """Handle error state."""
         self._error_count += 1
-        if self._error_count >= MAX_ERRORS:
+        if self._error_count >= self._max_errors:
             self._available = False
+            self._fleet.mark_unavailable(self._ip)
             if ENABLE_LOGGING:
                 _LOGGER.error(f"[{self._name}] {message} (Unavailable)")
         else:
             if ENABLE_LOGGING:
-                _LOGGER.warning(f"[{self._name}] {message} (Retry {self._error_count}/{MAX_ERRORS})")
\ No newline at end of file
+                _LOGGER.warning(f"[{self._name}] {message} (Retry {self._error_count}/{self._max_errors})")
\ No newline at end of file